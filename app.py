@@ -9,16 +9,25 @@ from kivy.core.video.video_ffpyplayer import VideoFFPy
 from kivy.core.text import LabelBase, DEFAULT_FONT
 from kivy.utils import platform
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import warnings
 warnings.filterwarnings("ignore")
 import sounddevice as sd
-import scipy.io.wavfile as wavfile
+import numpy as np
 import os
-import io
-import tempfile
-from threading import Timer
+import json
+import queue
+import threading
+import uuid
+import re
 import time
+import logging
+import statistics
 import traceback
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
 
 # Get server URL from environment variable or use default
 # Use the external IP address of your GCP VM
@@ -33,6 +42,97 @@ BASE_URL = f"http://34.22.84.227"
 # Windows: set SERVER_IP=your_vm_ip_address
 # Linux/Mac: export SERVER_IP=your_vm_ip_address
 
+# 녹음 설정 - Whisper가 16kHz로 동작하므로 처음부터 16kHz로 녹음
+SAMPLE_RATE = 16000
+FRAME_MS = 30                  # VAD 판단 단위 (ms)
+MAX_RECORD_SECONDS = 7         # 최대 녹음 시간 (초)
+MIN_SPEECH_SECONDS = 0.2       # 발화 시작으로 판단할 최소 연속 음성 길이 (초)
+END_SILENCE_SECONDS = 0.8      # 발화 후 이만큼 조용하면 발화 종료로 판단 (초)
+VAD_CALIBRATION_SECONDS = 0.3  # 시작 직후 주변 소음 측정 구간 (초)
+VAD_THRESHOLD_RATIO = 3.0      # 주변 소음 대비 음성 판단 배수
+VAD_MIN_RMS = 300              # 16-bit 기준 최소 음성 RMS
+VAD_MAX_RMS = 1500             # 시작하자마자 말해 보정 구간에 음성이 섞여도 임계값이 이보다 높아지지 않음
+VAD_NOISE_PERCENTILE = 20      # 보정 구간 중 조용한 프레임 기준으로 소음 수준 추정 (백분위)
+UPLOAD_CHUNK_SECONDS = 0.5     # 녹음 중 서버로 업로드하는 청크 길이 (초)
+
+# 비디오 캐시 설정 - 재시작 후에도 유지되며 용량을 넘으면 오래 안 본 영상부터 삭제
+CACHE_DIR = os.environ.get('STT_YT_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.stt_yt_cache'))
+CACHE_MAX_BYTES = int(os.environ.get('STT_YT_CACHE_MAX_MB', 2048)) * 1024 * 1024
+
+# 단계별 지연 시간 로그 - 음성 검색 한 번당 JSON 한 줄, 크기를 넘으면 롤링
+LATENCY_LOG_PATH = os.path.join(CACHE_DIR, 'latency.log')
+LATENCY_LOG_MAX_BYTES = 1024 * 1024
+LATENCY_LOG_BACKUPS = 3
+
+# 서버 요청 설정
+REQUEST_TIMEOUT = 30           # 연결/응답 대기 시간 (초)
+TRANSCRIBE_TIMEOUT = 120       # 음성 인식은 오래 걸릴 수 있음 (초)
+
+# 화질 선택 - 측정한 다운로드 처리량을 서버에 보내 이 시간 안에 받을 수 있는 화질을 요청
+TARGET_STARTUP_SECONDS = 15
+THROUGHPUT_SMOOTHING = 0.5     # 처리량 지수이동평균 가중치 (새 측정값 비중)
+MIN_THROUGHPUT_SAMPLE_BYTES = 256 * 1024  # 이보다 작은 다운로드는 측정에서 제외
+
+
+def create_http_session(retry=None):
+    """서버 호출에 사용할 keep-alive 세션을 만듭니다.
+
+    커넥션 풀을 재사용하고, 기본 정책은 연결 실패와 502/503/504 응답을 지수 백오프로 재시도합니다.
+    서버 API는 모두 POST지만 같은 요청을 다시 보내도 결과가 같으므로 POST도 재시도합니다.
+    """
+    if retry is None:
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False
+        )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def load_client_id():
+    """캐시 디렉토리에 저장된 클라이언트 ID를 읽고, 없으면 새로 만들어 저장합니다.
+
+    실행할 때마다 같은 ID를 보내야 서버가 이 클라이언트의 최근 언어를 기억할 수 있습니다.
+    """
+    path = os.path.join(CACHE_DIR, 'client_id')
+    try:
+        with open(path) as f:
+            client_id = f.read().strip()
+        if client_id:
+            return client_id
+    except OSError:
+        pass
+    client_id = uuid.uuid4().hex
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(client_id)
+    except OSError as e:
+        print(f"클라이언트 ID 저장 실패: {e}")
+    return client_id
+
+
+http = create_http_session()
+# /transcribe/ 전용 세션 - 요청이 서버에 도달하지 못한 연결 실패만 재시도하고, 읽기 시간 초과나
+# 504는 재시도하지 않음 (503 + Retry-After는 transcribe_audio가 전체 기한 안에서 직접 재시도)
+transcribe_http = create_http_session(Retry(
+    total=2,
+    connect=2,
+    read=0,
+    status=0,
+    backoff_factor=0.5,
+    allowed_methods=frozenset(['POST']),
+    raise_on_status=False
+))
+# 서버가 이 클라이언트의 녹음 데이터와 최근 언어를 다른 클라이언트와 구분하는 데 사용
+http.headers['X-Client-ID'] = transcribe_http.headers['X-Client-ID'] = load_client_id()
+
 # 기존 폰트 등록 코드 대체
 def setup_system_fonts():
     """시스템 폰트를 사용하여 다국어 지원 설정"""
@@ -61,11 +161,266 @@ setup_system_fonts()
 Video._video = VideoFFPy
 
 
+class ChunkUploader:
+    """녹음 중인 PCM 청크를 백그라운드 스레드에서 순서대로 서버(/record_chunk/)에 전송합니다."""
+
+    def __init__(self, sample_rate, headers=None):
+        self.session_id = uuid.uuid4().hex
+        self.sample_rate = sample_rate
+        self.headers = dict(headers or {}, **{'Content-Type': 'application/octet-stream'})
+        self.seq = 0
+        self.error = None
+        self.result = None
+        self.chunks = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def send(self, pcm_bytes, final=False):
+        """청크를 업로드 대기열에 추가합니다. 녹음 루프를 막지 않습니다."""
+        self.chunks.put((self.seq, pcm_bytes, final))
+        self.seq += 1
+
+    def finish(self, pcm_bytes=b'', timeout=30):
+        """마지막 청크를 보내고 업로드가 끝날 때까지 기다립니다."""
+        self.send(pcm_bytes, final=True)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            self.error = self.error or "업로드 시간 초과"
+        return self.error is None
+
+    def abort(self):
+        """전송하지 않고 업로드 스레드를 종료합니다."""
+        self.chunks.put(None)
+
+    def _run(self):
+        while True:
+            item = self.chunks.get()
+            if item is None:
+                return
+            seq, pcm_bytes, final = item
+            # 앞선 청크가 실패하면 이후 청크는 보내지 않음 (서버는 TTL 후 세션 정리)
+            if self.error is None:
+                try:
+                    response = http.post(
+                        f"{BASE_URL}/record_chunk/",
+                        params={
+                            'session_id': self.session_id,
+                            'seq': seq,
+                            'sample_rate': self.sample_rate,
+                            'final': '1' if final else '0'
+                        },
+                        data=pcm_bytes,
+                        headers=self.headers,
+                        timeout=10
+                    )
+                    if response.status_code != 200:
+                        self.error = response.json().get('detail', '알 수 없는 오류')
+                    elif final:
+                        self.result = response.json()
+                except Exception as e:
+                    self.error = str(e)
+            if final:
+                return
+
+
+class VideoCache:
+    """video_id 단위로 다운로드한 비디오를 디스크에 보관하는 LRU 캐시.
+
+    인덱스(index.json)에 제목, 크기, 마지막 재생 시각을 기록해 앱을 다시 시작해도 캐시가 유지됩니다.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # 인덱스에는 있지만 파일이 사라진 항목 제거
+        return {
+            video_id: entry for video_id, entry in index.items()
+            if os.path.exists(self.path_for(video_id))
+        }
+
+    def _save_index(self):
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"캐시 인덱스 저장 실패: {str(e)}")
+
+    def path_for(self, video_id):
+        return os.path.join(self.cache_dir, f"{video_id}.mp4")
+
+    def get(self, video_id):
+        """캐시된 (경로, 제목)을 반환하고 최근 사용으로 표시합니다. 없으면 None."""
+        entry = self.index.get(video_id)
+        path = self.path_for(video_id)
+        if entry is None or not os.path.exists(path):
+            return None
+        entry['last_access'] = time.time()
+        self._save_index()
+        return path, entry['title']
+
+    def put(self, video_id, title):
+        """path_for(video_id)에 다운로드가 끝난 파일을 캐시에 등록합니다."""
+        self.index[video_id] = {
+            'title': title,
+            'size': os.path.getsize(self.path_for(video_id)),
+            'last_access': time.time()
+        }
+        self._save_index()
+
+    def evict(self, keep=()):
+        """용량을 넘으면 마지막 재생이 오래된 비디오부터 삭제합니다. keep의 video_id는 제외합니다."""
+        total = sum(entry['size'] for entry in self.index.values())
+        for video_id in sorted(self.index, key=lambda v: self.index[v]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if video_id in keep:
+                continue
+            try:
+                path = self.path_for(video_id)
+                if os.path.exists(path):
+                    os.remove(path)
+                    print(f"캐시 파일 삭제: {path}")
+                total -= self.index.pop(video_id)['size']
+            except OSError as e:
+                # 재생 중이라 잠긴 파일 등은 다음 정리 때 다시 시도
+                print(f"파일 삭제 실패: {str(e)}: {video_id}")
+        self._save_index()
+
+
+class LatencyTracker:
+    """음성 검색 한 번(record_and_process)의 단계별 소요 시간을 기록합니다.
+
+    진행 중의 서버 요청에는 headers()로 같은 X-Request-ID를 붙이고, 응답의 Server-Timing 헤더를
+    함께 저장해 클라이언트에서 잰 시간 중 네트워크 시간과 서버 연산 시간을 구분할 수 있게 합니다.
+    """
+    PHASES = ['record', 'upload', 'transcribe', 'search', 'download', 'first_frame']
+
+    def __init__(self, log_path):
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        self.logger = logging.getLogger('stt_yt.latency')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(log_path, maxBytes=LATENCY_LOG_MAX_BYTES,
+                                          backupCount=LATENCY_LOG_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+        self.entries = []  # 이번 실행에서 기록한 항목 (종료 시 요약)
+        self.current = None
+        self.started = None
+        self.first_frame_start = None
+
+    def start(self):
+        """새 음성 검색을 시작합니다. 이전 항목이 끝나지 않았으면 abandoned로 기록합니다."""
+        if self.current:
+            self.finish('abandoned')
+        request_id = uuid.uuid4().hex
+        self.current = {
+            'request_id': request_id,
+            'timestamp': datetime.now().isoformat(),
+            'phases': {},
+            'server': {}
+        }
+        self.started = time.perf_counter()
+        self.first_frame_start = None
+
+    def headers(self):
+        """현재 음성 검색의 서버 요청에 붙일 헤더. 공유 세션 헤더는 다른 스레드/요청과 섞이므로 요청마다 전달."""
+        return {'X-Request-ID': self.current['request_id']} if self.current else {}
+
+    def add(self, phase, seconds):
+        if self.current:
+            self.current['phases'][phase] = round(seconds * 1000, 1)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add_server_timing(self, phase, response):
+        """응답의 Server-Timing 헤더(ms)를 단계별로 저장합니다."""
+        if not self.current:
+            return
+        echoed = response.headers.get('X-Request-ID')
+        if echoed and echoed != self.current['request_id']:
+            print(f"Unexpected X-Request-ID in response: {echoed}")
+        header = response.headers.get('Server-Timing')
+        if header:
+            self.current['server'][phase] = {
+                name: float(duration) for name, duration in re.findall(r'([\w-]+);dur=([\d.]+)', header)
+            }
+
+    def wait_first_frame(self):
+        """재생을 시작했으니 첫 프레임이 표시되면 항목을 마무리합니다. 재생 상태로 바꾸는 시점에 호출합니다."""
+        self.first_frame_start = time.perf_counter()
+
+    def on_first_frame(self):
+        if self.current and self.first_frame_start is not None:
+            self.add('first_frame', time.perf_counter() - self.first_frame_start)
+            self.finish('ok')
+
+    def finish(self, status):
+        """현재 항목을 로그에 기록합니다."""
+        if not self.current:
+            return
+        entry, self.current = self.current, None
+        entry['status'] = status
+        entry['total_ms'] = round((time.perf_counter() - self.started) * 1000, 1)
+        self.logger.info(json.dumps(entry, ensure_ascii=False))
+        self.entries.append(entry)
+        
+        breakdown = ', '.join(
+            f"{phase} {entry['phases'][phase]:.0f}ms"
+            + (f" (server {entry['server'][phase]['total']:.0f}ms)" if 'total' in entry['server'].get(phase, {}) else '')
+            for phase in self.PHASES if phase in entry['phases']
+        )
+        print(f"[latency {entry['request_id'][:8]}] {status} total {entry['total_ms']:.0f}ms: {breakdown}")
+
+    def summary(self):
+        """이번 실행에서 기록한 항목의 단계별 중앙값/p90과 서버/네트워크 시간 비중을 정리합니다."""
+        if not self.entries:
+            return None
+        lines = [f"Latency summary ({len(self.entries)} requests)"]
+        for phase in self.PHASES:
+            entries = [entry for entry in self.entries if phase in entry['phases']]
+            if not entries:
+                continue
+            values = sorted(entry['phases'][phase] for entry in entries)
+            line = (f"  {phase:12s} n={len(values):3d} median={statistics.median(values):7.0f}ms "
+                    f"p90={values[int(0.9 * (len(values) - 1))]:7.0f}ms")
+            # 서버 처리 시간을 뺀 나머지를 네트워크(+클라이언트) 시간으로 봄
+            pairs = [(entry['phases'][phase], entry['server'][phase]['total'])
+                     for entry in entries if 'total' in entry['server'].get(phase, {})]
+            if pairs:
+                line += (f" server={statistics.median(server for _, server in pairs):7.0f}ms"
+                         f" network={statistics.median(client - server for client, server in pairs):7.0f}ms")
+            lines.append(line)
+        return "\n".join(lines)
+
+
 class MyApp(App):
     def __init__(self, **kwargs):
         super(MyApp, self).__init__(**kwargs)
         self.current_video_path = None
-        self.downloaded_videos = []  # Keep track of downloaded videos
+        self.current_video_id = None
+        self.cache = VideoCache(CACHE_DIR, CACHE_MAX_BYTES)
+        self.throughput_kbps = None  # 측정한 다운로드 처리량 (지수이동평균)
+        self.latency = LatencyTracker(LATENCY_LOG_PATH)
     
     def build(self):
         Window.bind(on_keyboard=self.on_keyboard)
@@ -112,26 +467,36 @@ class MyApp(App):
 
     def record_and_process(self, instance):
         """Record audio, transcribe it, and play a related YouTube video."""
+        self.latency.start()
+        status = 'error'
         try:
             self.info_label.text = "녹음 중..."
             if not self.record_audio():
+                status = 'record_failed'
                 return
             
             self.info_label.text = "음성 인식 중..."
-            text = self.transcribe_audio()
+            with self.latency.phase('transcribe'):
+                text = self.transcribe_audio()
             
             if not text or text.strip() == "":
                 self.info_label.text = "인식된 텍스트가 없습니다. 다시 시도해주세요."
+                status = 'no_text'
                 return
                 
             self.info_label.text = f"인식된 텍스트: {text}\n비디오 검색 중..."
-            video_id = self.search_youtube(text)
+            with self.latency.phase('search'):
+                video_id = self.search_youtube(text)
             
             if not video_id:
                 self.info_label.text = f"'{text}'에 대한 비디오를 찾을 수 없습니다."
+                status = 'no_video'
                 return
 
-            self.play_video(video_id)
+            if self.play_video(video_id):
+                status = 'playing'
+            else:
+                status = 'play_failed'
             
         except requests.exceptions.ConnectionError:
             self.info_label.text = "서버 연결 실패. 네트워크 상태를 확인하세요."
@@ -139,45 +504,126 @@ class MyApp(App):
             self.info_label.text = f"오류 발생: {str(e)}"
             print(f"Error in record_and_process: {str(e)}")
             traceback.print_exc()
+        finally:
+            # 재생을 시작했으면 첫 프레임이 표시될 때 기록을 마무리함
+            if status != 'playing':
+                self.latency.finish(status)
 
     def record_audio(self):
-        """메모리 버퍼에 녹음한 후 서버로 직접 전송합니다."""
+        """발화가 끝날 때까지 녹음하면서 청크 단위로 서버에 업로드합니다.
+
+        InputStream 콜백이 프레임을 큐에 넣고, 에너지 기반 VAD로 발화 종료를 감지하면
+        최대 녹음 시간 전이라도 녹음을 멈춥니다. 발화를 감지하지 못해도 녹음은 버리지 않고
+        최대 녹음 시간까지 모두 업로드합니다. 업로드는 녹음과 동시에 진행되므로
+        녹음이 끝난 뒤에는 마지막 청크만 전송하면 됩니다.
+        """
+        frame_size = int(SAMPLE_RATE * FRAME_MS / 1000)
+        frame_seconds = frame_size / SAMPLE_RATE
+        calibration_frames = int(VAD_CALIBRATION_SECONDS / frame_seconds)
+        min_speech_frames = max(1, int(MIN_SPEECH_SECONDS / frame_seconds))
+        end_silence_frames = int(END_SILENCE_SECONDS / frame_seconds)
+        chunk_frames = max(1, int(UPLOAD_CHUNK_SECONDS / frame_seconds))
+        
+        frames = queue.Queue()
+        
+        def callback(indata, frame_count, time_info, status):
+            if status:
+                print(f"Recording status: {status}")
+            frames.put(indata.copy())
+        
+        uploader = ChunkUploader(SAMPLE_RATE, headers=self.latency.headers())
+        pending = []
+        noise_levels = []
+        threshold = VAD_MIN_RMS
+        voiced_run = 0
+        silence_run = 0
+        speech_started = False
+        frame_count = 0
+        
         try:
-            fs = 44100  # 샘플링 레이트
-            duration = 7  # 녹음 시간 (초)
-            
             self.info_label.text = "녹음 중..."
-            recording = sd.rec(int(duration * fs), samplerate=fs, channels=1)
-            sd.wait()  # 녹음이 끝날 때까지 대기
+            record_start = time.perf_counter()
+            with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16',
+                                blocksize=frame_size, callback=callback):
+                while True:
+                    frame = frames.get(timeout=2)
+                    frame_count += 1
+                    pending.append(frame)
+                    
+                    rms = float(np.sqrt(np.mean(frame.astype(np.float32) ** 2)))
+                    if frame_count <= calibration_frames:
+                        # 시작 직후 구간으로 주변 소음 수준 측정 - 바로 말을 시작해도 임계값이
+                        # 음성보다 높아지지 않도록 조용한 프레임 기준으로 추정하고 상한을 둠
+                        noise_levels.append(rms)
+                        noise = np.percentile(noise_levels, VAD_NOISE_PERCENTILE)
+                        threshold = min(VAD_MAX_RMS, max(VAD_MIN_RMS, noise * VAD_THRESHOLD_RATIO))
+                    elif rms > threshold:
+                        voiced_run += 1
+                        silence_run = 0
+                        if voiced_run >= min_speech_frames:
+                            speech_started = True
+                    else:
+                        voiced_run = 0
+                        silence_run += 1
+                    
+                    if len(pending) >= chunk_frames:
+                        uploader.send(np.concatenate(pending).tobytes())
+                        pending = []
+                    
+                    elapsed = frame_count * frame_seconds
+                    if speech_started and silence_run >= end_silence_frames:
+                        break  # 발화 종료
+                    if elapsed >= MAX_RECORD_SECONDS:
+                        break
             
-            # WAV 파일로 저장하는 대신 BytesIO 객체에 저장
-            audio_buffer = io.BytesIO()
-            # 헤더 정보(샘플레이트, 채널 등) 포함하여 WAV 형식으로 버퍼에 저장
-            wavfile.write(audio_buffer, fs, recording)
-            audio_buffer.seek(0)  # 버퍼 포인터를 처음으로 이동
+            self.latency.add('record', time.perf_counter() - record_start)
             
-            # 서버로 버퍼 직접 전송
-            files = {'audio': ('audio.wav', audio_buffer, 'audio/wav')}
-            response = requests.post(f"{BASE_URL}/record/", files=files)
+            if not speech_started:
+                # VAD가 놓쳤을 수 있으므로 녹음 전체를 보내 인식 결과로 판단
+                print("Speech end not detected, uploading the full recording")
             
-            if response.status_code == 200:
+            # 녹음이 끝난 뒤 남은 청크 전송에 걸린 시간만 upload로 기록 (나머지는 녹음과 겹침)
+            remaining = np.concatenate(pending).tobytes() if pending else b''
+            with self.latency.phase('upload'):
+                uploaded = uploader.finish(remaining)
+            if uploaded:
                 self.info_label.text = "녹음 완료"
-                print(response.json()["message"])
+                print(f"{uploader.result['message']} ({frame_count * frame_seconds:.1f}s)")
                 return True
             else:
-                error_msg = response.json().get('detail', '알 수 없는 오류')
-                self.info_label.text = f"녹음 전송 실패: {error_msg}"
-                print(f"Error: {error_msg}")
+                self.info_label.text = f"녹음 전송 실패: {uploader.error}"
+                print(f"Error: {uploader.error}")
                 return False
             
         except Exception as e:
+            uploader.abort()
             self.info_label.text = f"녹음 실패: {str(e)}"
             print(f"Recording error: {str(e)}")
             return False
 
     def transcribe_audio(self):
-        """Calls the server to transcribe audio."""
-        response = requests.post(f"{BASE_URL}/transcribe/")
+        """Calls the server to transcribe audio.
+
+        TRANSCRIBE_TIMEOUT은 재시도를 포함한 전체 기한입니다. 대기열이 가득 차 503과 Retry-After를
+        받으면 남은 시간 안에서만 기다렸다가 다시 요청하고, 매번 남은 시간을 X-Request-Deadline-Ms로
+        보내 서버가 그 기한이 지나면 대기/디코딩을 중단하도록 합니다.
+        """
+        deadline = time.monotonic() + TRANSCRIBE_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            response = transcribe_http.post(
+                f"{BASE_URL}/transcribe/",
+                headers=dict(self.latency.headers(), **{'X-Request-Deadline-Ms': str(int(remaining * 1000))}),
+                timeout=remaining
+            )
+            retry_after = response.headers.get('Retry-After', '')
+            if not (response.status_code == 503 and retry_after.isdigit()):
+                break
+            if time.monotonic() + int(retry_after) >= deadline:
+                break
+            print(f"Transcription queue full, retrying in {retry_after}s")
+            time.sleep(int(retry_after))
+        self.latency.add_server_timing('transcribe', response)
         if response.status_code == 200:
             result = response.json()
             transcribed_text = result["text"]
@@ -190,7 +636,9 @@ class MyApp(App):
 
     def search_youtube(self, query):
         """Calls the server to search YouTube."""
-        response = requests.post(f"{BASE_URL}/search_youtube/", json={"query": query})
+        response = http.post(f"{BASE_URL}/search_youtube/", json={"query": query},
+                             headers=self.latency.headers(), timeout=REQUEST_TIMEOUT)
+        self.latency.add_server_timing('search', response)
         if response.status_code == 200:
             video_id = response.json()["video_id"]
             print(f"Found YouTube video ID: {video_id}")
@@ -202,19 +650,40 @@ class MyApp(App):
             return None
 
     def play_video(self, video_id):
-        """서버에서 비디오를 다운로드한 후 재생합니다."""
+        """캐시에 있으면 바로 재생하고, 없으면 서버에서 다운로드해 캐시에 저장한 후 재생합니다."""
         try:
+            cached = self.cache.get(video_id)
+            if cached:
+                video_path, video_title = cached
+                print(f"캐시에서 재생: {video_path}")
+                self.latency.add('download', 0)
+                self.current_video_id = video_id
+                self.current_video_path = video_path
+                if not self.update_video_widget(video_path, video_title):
+                    return None
+                return video_title
+            
             self.info_label.text = "비디오 다운로드 중..."
             
-            temp_dir = tempfile.gettempdir()
-            temp_path = os.path.join(temp_dir, f"temp_video_{video_id}.mp4")
+            video_path = self.cache.path_for(video_id)
+            part_path = video_path + '.part'
+            
+            # 측정한 처리량을 보내 서버가 제시간에 받을 수 있는 화질을 고르도록 함
+            request_data = {"video_id": video_id, "target_startup_seconds": TARGET_STARTUP_SECONDS}
+            if self.throughput_kbps:
+                request_data["throughput_kbps"] = round(self.throughput_kbps)
+            
+            download_start = time.perf_counter()
             
             # 서버로부터 직접 비디오 다운로드
-            with requests.post(
+            with http.post(
                 f"{BASE_URL}/download_video/", 
-                json={"video_id": video_id}, 
-                stream=True
+                json=request_data, 
+                headers=self.latency.headers(),
+                stream=True,
+                timeout=REQUEST_TIMEOUT
             ) as response:
+                self.latency.add_server_timing('download', response)
                 if response.status_code != 200:
                     error_msg = response.json().get('detail', '알 수 없는 오류')
                     self.info_label.text = f'비디오 다운로드 실패: {error_msg}'
@@ -222,27 +691,22 @@ class MyApp(App):
                     
                 # 응답 헤더에서 비디오 제목 가져오기
                 video_title = response.headers.get('X-Video-Title', 'Unknown Video')
+                print(f"화질: {response.headers.get('X-Quality-Height')}p "
+                      f"({response.headers.get('X-Quality-Reason')})")
                     
-                total_size = int(response.headers.get('content-length', 0))
-                
-                with open(temp_path, 'wb') as f:
-                    if total_size == 0:
-                        f.write(response.content)
-                    else:
-                        downloaded = 0
-                        for chunk in response.iter_content(chunk_size=1024*1024):  # 1MB chunks
-                            downloaded += len(chunk)
-                            f.write(chunk)
-                            progress = int(downloaded / total_size * 100)
-                            self.info_label.text = f"다운로드 중... {progress}%"
+                self._save_response(response, part_path)
+            self.latency.add('download', time.perf_counter() - download_start)
             
-            # 다운로드 성공한 경우 목록에 추가
-            self.downloaded_videos.append(temp_path)
-            self.current_video_path = temp_path
+            # 다운로드가 끝난 파일만 캐시에 등록
+            os.replace(part_path, video_path)
+            self.cache.put(video_id, video_title)
+            self.current_video_id = video_id
+            self.current_video_path = video_path
             self.cleanup_old_videos()
             
             # 비디오 위젯 업데이트 및 재생
-            self.update_video_widget(temp_path, video_title)
+            if not self.update_video_widget(video_path, video_title):
+                return None
             return video_title
                 
         except Exception as e:
@@ -255,37 +719,55 @@ class MyApp(App):
             
     def download_video(self, video_id, video_url):
         """비디오 다운로드 로직."""
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, f"temp_video_{video_id}.mp4")
+        cached = self.cache.get(video_id)
+        if cached:
+            return cached[0]
         
-        self.info_label.text = "비디오 다운로드 중..."
-        response = requests.get(video_url, stream=True)
-        total_size = int(response.headers.get('content-length', 0))
+        video_path = self.cache.path_for(video_id)
+        part_path = video_path + '.part'
         
+        self.info_label.text = "비디오 다운로드 중..."
         try:
-            with open(temp_path, 'wb') as f:
-                if total_size == 0:
-                    f.write(response.content)
-                else:
-                    downloaded = 0
-                    chunk_size = 1024 * 1024  # 1MB 단위로 다운로드
-                    for data in response.iter_content(chunk_size=chunk_size):
-                        downloaded += len(data)
-                        f.write(data)
-                        progress = int((downloaded / total_size) * 100)
-                        self.info_label.text = f"다운로드 중... {progress}%"
-                        
-            # 다운로드 성공한 경우에만 목록에 추가
-            self.downloaded_videos.append(temp_path)
-            self.current_video_path = temp_path
+            with http.get(video_url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                self._save_response(response, part_path)
+            
+            # 다운로드 성공한 경우에만 캐시에 등록
+            os.replace(part_path, video_path)
+            self.cache.put(video_id, video_id)
+            self.current_video_id = video_id
+            self.current_video_path = video_path
             self.cleanup_old_videos()
-            return temp_path
+            return video_path
         except Exception as e:
             self.info_label.text = f"다운로드 실패: {str(e)}"
             return None
+    
+    def _save_response(self, response, path):
+        """스트리밍 응답을 1MB 단위로 파일에 저장하며 진행률을 표시하고 처리량을 측정합니다."""
+        total_size = int(response.headers.get('content-length', 0))
+        
+        start = time.perf_counter()
+        with open(path, 'wb') as f:
+            downloaded = 0
+            for chunk in response.iter_content(chunk_size=1024*1024):  # 1MB chunks
+                downloaded += len(chunk)
+                f.write(chunk)
+                if total_size:
+                    progress = int(downloaded / total_size * 100)
+                    self.info_label.text = f"다운로드 중... {progress}%"
+        elapsed = time.perf_counter() - start
+        
+        # 응답 본문 전송 구간만 측정 (서버 처리 시간 제외)
+        if downloaded >= MIN_THROUGHPUT_SAMPLE_BYTES and elapsed > 0:
+            sample_kbps = downloaded * 8 / 1000 / elapsed
+            if self.throughput_kbps is None:
+                self.throughput_kbps = sample_kbps
+            else:
+                self.throughput_kbps += THROUGHPUT_SMOOTHING * (sample_kbps - self.throughput_kbps)
+            print(f"다운로드 처리량: {sample_kbps:.0f} kbps (평균 {self.throughput_kbps:.0f} kbps)")
         
     def update_video_widget(self, video_path, video_title):
-        """비디오 위젯 업데이트 및 재생."""
+        """비디오 위젯 업데이트 및 재생. 재생을 시작했으면 True."""
         try:
             # 이전 비디오 정리
             if hasattr(self, 'video') and self.video:
@@ -295,7 +777,7 @@ class MyApp(App):
             # Make sure the path exists
             if not os.path.exists(video_path):
                 self.info_label.text = f"비디오 파일을 찾을 수 없음: {video_path}"
-                return
+                return False
                 
             print(f"Playing video from: {video_path}")
             
@@ -309,62 +791,44 @@ class MyApp(App):
             
             self.layout.add_widget(self.video)
             
-            # Wait a moment before playing
-            Clock.schedule_once(lambda dt: setattr(self.video, 'state', 'play'), 0.5)
+            # 첫 프레임이 텍스처로 올라오는 시점을 지연 시간 기록에 사용
+            def on_texture(instance, texture):
+                if texture is not None:
+                    instance.unbind(texture=on_texture)
+                    self.latency.on_first_frame()
+            self.video.bind(texture=on_texture)
+            
+            # Wait a moment before playing - 첫 프레임 시간은 대기 시간을 빼고 재생을 시작한 시점부터 측정
+            def start_playback(dt):
+                self.latency.wait_first_frame()
+                self.video.state = 'play'
+            Clock.schedule_once(start_playback, 0.5)
             self.info_label.text = f'재생 중인 영상: {video_title}'
+            return True
         except Exception as e:
             self.info_label.text = f"비디오 재생 실패: {str(e)}"
             print(f"Error in update_video_widget: {traceback.format_exc()}")
+            return False
     def cleanup_old_videos(self):
-        """이전에 다운로드한 임시 비디오 파일을 삭제합니다."""
-        # First, stop the current video playback
-        if hasattr(self, 'video') and self.video:
-            self.video.state = 'stop'
-        
-        for video_path in self.downloaded_videos[:]:
-            try:
-                # Only delete if it's not the currently playing video
-                if video_path != self.current_video_path:
-                    if os.path.exists(video_path):
-                        os.remove(video_path)
-                        print(f"임시 파일 삭제: {video_path}")
-                    self.downloaded_videos.remove(video_path)
-            except Exception as e:
-                print(f"파일 삭제 실패: {str(e)}: {video_path}")
-
-    def schedule_cleanup(self, path, delay=5):
-        """파일 삭제를 지연시켜 파일 잠금 문제를 방지합니다."""
-        def delayed_delete():
-            try:
-                if os.path.exists(path):
-                    os.remove(path)
-                    print(f"지연 삭제 성공: {path}")
-                    if path in self.downloaded_videos:
-                        self.downloaded_videos.remove(path)
-            except Exception as e:
-                print(f"지연 삭제 실패: {str(e)}: {path}")
-        
-        # Schedule deletion after specified delay (seconds)
-        Timer(delay, delayed_delete).start()
+        """캐시 용량을 넘으면 오래 재생하지 않은 비디오부터 삭제합니다. 현재 비디오는 유지합니다."""
+        self.cache.evict(keep={self.current_video_id})
 
     def on_stop(self):
-        """앱 종료 시 임시 파일 정리"""
+        """앱 종료 시 재생을 멈춥니다. 캐시된 비디오는 다음 실행을 위해 남겨둡니다."""
         # Stop video playback
         if hasattr(self, 'video') and self.video:
             self.video.state = 'stop'
-            
-        # Small delay to ensure video player releases the file
-        time.sleep(0.5)
         
-        # Try to delete all temporary files
-        for video_path in self.downloaded_videos[:]:
-            try:
-                if os.path.exists(video_path):
-                    os.remove(video_path)
-                    print(f"앱 종료 시 파일 삭제: {video_path}")
-                    self.downloaded_videos.remove(video_path)
-            except Exception as e:
-                print(f"종료 시 파일 삭제 실패: {str(e)}: {video_path}")
+        self.cleanup_old_videos()
+        
+        # 첫 프레임 전에 종료했으면 그대로 기록하고 이번 실행의 요약 출력
+        self.latency.finish('stopped')
+        summary = self.latency.summary()
+        if summary:
+            print(summary)
+            self.latency.logger.info(json.dumps({'summary': summary}, ensure_ascii=False))
+        http.close()
+        transcribe_http.close()
                 
         return super(MyApp, self).on_stop()
 
@@ -0,0 +1,330 @@
+"""Offline CPU benchmark for the server transcription path (server.transcribe_bytes).
+
+Fixture clips are generated from a base signal and vary one axis at a time
+around a baseline (10 s, 16 kHz, 16-bit PCM WAV, no silence): length,
+sample rate, encoding and silence ratio. Each clip goes through the same
+transcribe_bytes() call the /transcribe/ endpoint uses, and the benchmark
+reports real-time factor, per-stage time and WER per clip, and the peak RSS
+of the whole run.
+
+By default no client ID is passed, so every run detects the language, as
+on a client's first request. With --language-prior all runs share one
+client ID. After the warm-up run they decode in the remembered language
+when the detection was confident, as on a returning client's requests.
+
+Usage:
+    # Synthetic base signal (no speech, so WER is not reported)
+    python benchmarks/transcribe_benchmark.py --output bench.json
+
+    # Real speech as the base signal, with its reference transcript
+    python benchmarks/transcribe_benchmark.py --source speech.wav --reference "lofi hip hop music"
+
+    # Extra shipped clips: a directory with manifest.json
+    # {"clips": [{"file": "query.wav", "reference": "..."}]}
+    python benchmarks/transcribe_benchmark.py --fixtures-dir benchmarks/fixtures
+
+    # Returning-client path (language detection skipped via the per-client prior)
+    python benchmarks/transcribe_benchmark.py --language-prior
+
+    # Compare against an earlier run
+    python benchmarks/transcribe_benchmark.py --compare old.json
+
+The model is selected with the server's WHISPER_MODEL / WHISPER_COMPUTE_TYPE
+environment variables. CUDA is hidden so runs are comparable across machines.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import time
+import wave
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# CPU 전용으로 실행 - server 임포트 전에 설정해야 함
+os.environ['CUDA_VISIBLE_DEVICES'] = ''
+os.environ.setdefault('ENABLE_RATE_LIMITING', 'false')
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+BASE_RATE = 16000
+BENCHMARK_CLIENT_ID = 'transcribe-benchmark'
+STAGES = ['audio_decode', 'language_detection', 'decode']
+
+# 기준 클립에서 한 가지 조건만 바꾼 변형들
+BASELINE = {'length': 10, 'sample_rate': 16000, 'encoding': 'pcm16', 'silence_ratio': 0.0}
+VARIANTS = {
+    'length': [3, 10, 30],
+    'sample_rate': [8000, 16000, 44100, 48000],
+    'encoding': ['pcm16', 'float32', 'mp3', 'opus'],
+    'silence_ratio': [0.0, 0.5, 0.8],
+}
+
+# ffmpeg 인코딩 옵션 (압축 포맷)
+FFMPEG_CODECS = {
+    'mp3': ['-c:a', 'libmp3lame', '-b:a', '64k', '-f', 'mp3'],
+    'opus': ['-c:a', 'libopus', '-b:a', '32k', '-f', 'ogg'],
+}
+
+
+def synthetic_speech(seconds, sample_rate=BASE_RATE, seed=0):
+    """음성과 비슷한 스펙트럼의 신호를 만듭니다 (음절 단위로 변하는 기본 주파수와 배음)."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+    syllable = 0.25
+    f0 = np.repeat(rng.uniform(100, 220, int(seconds / syllable) + 1), int(syllable * sample_rate))[:n]
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    signal = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.abs(np.sin(np.pi * t / syllable)) ** 0.5
+    signal = signal * envelope + 0.02 * rng.standard_normal(n)
+    return (0.3 * signal / np.max(np.abs(signal))).astype(np.float32)
+
+
+def load_source(path):
+    """기준 음성 파일을 16kHz float32로 읽습니다."""
+    from faster_whisper.audio import decode_audio
+    return decode_audio(path, sampling_rate=BASE_RATE)
+
+
+def build_clip(base, reference, length, silence_ratio):
+    """기준 음성을 반복/무음 패딩해 정확히 length초, 무음 비율 silence_ratio인 클립을 만듭니다.
+
+    음성은 필요한 만큼 반복한 뒤 잘라 맞추고, 정답도 같은 비율로 단어를 잘라 맞춥니다
+    (기준 음성 안에서 단어가 고르게 분포한다고 가정한 근사치).
+    """
+    total = int(round(length * BASE_RATE))
+    speech_samples = int(round(total * (1 - silence_ratio)))
+    repeats = speech_samples / len(base)
+    speech = np.tile(base, int(np.ceil(repeats)))[:speech_samples]
+    
+    words = reference.split()
+    reference_words = (words * int(np.ceil(repeats)))[:int(round(len(words) * repeats))]
+    
+    silence = total - speech_samples
+    lead = np.zeros(silence // 2, dtype=np.float32)
+    tail = np.zeros(silence - silence // 2, dtype=np.float32)
+    return np.concatenate([lead, speech, tail]), " ".join(reference_words)
+
+
+def resample(audio, sample_rate):
+    if sample_rate == BASE_RATE:
+        return audio
+    n = int(len(audio) * sample_rate / BASE_RATE)
+    return np.interp(np.arange(n) * BASE_RATE / sample_rate, np.arange(len(audio)), audio).astype(np.float32)
+
+
+def encode(audio, sample_rate, encoding):
+    """클립을 주어진 포맷의 바이트로 인코딩합니다. ffmpeg가 없으면 압축 포맷은 None."""
+    if encoding == 'pcm16':
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes((np.clip(audio, -1, 1) * 32767).astype('<i2').tobytes())
+        return buffer.getvalue()
+    if encoding == 'float32':
+        # wave 모듈은 IEEE float WAV를 쓰지 못하므로 헤더를 직접 작성 (format tag 3)
+        data = audio.astype('<f4').tobytes()
+        header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + len(data), b'WAVE', b'fmt ', 16,
+                             3, 1, sample_rate, sample_rate * 4, 4, 32, b'data', len(data))
+        return header + data
+    if shutil.which('ffmpeg') is None:
+        return None
+    result = subprocess.run(
+        ['ffmpeg', '-nostdin', '-loglevel', 'error', '-f', 'f32le', '-ar', str(sample_rate), '-ac', '1',
+         '-i', 'pipe:0'] + FFMPEG_CODECS[encoding] + ['pipe:1'],
+        input=audio.astype('<f4').tobytes(), capture_output=True, check=True
+    )
+    return result.stdout
+
+
+def generate_fixtures(base, reference):
+    """VARIANTS의 각 조건별로 클립을 만듭니다. (이름, 조건, 오디오 바이트, 길이, 정답) 목록."""
+    fixtures = []
+    seen = set()
+    for axis, values in VARIANTS.items():
+        for value in values:
+            params = dict(BASELINE, **{axis: value})
+            key = tuple(sorted(params.items()))
+            if key in seen:
+                continue
+            seen.add(key)
+            clip, clip_reference = build_clip(base, reference, params['length'], params['silence_ratio'])
+            audio_bytes = encode(resample(clip, params['sample_rate']), params['sample_rate'], params['encoding'])
+            if audio_bytes is None:
+                print(f"Skipping {params['encoding']} clips: ffmpeg not found")
+                continue
+            name = "len{length}_{sample_rate}hz_{encoding}_sil{silence_ratio}".format(**params)
+            fixtures.append((name, params, audio_bytes, len(clip) / BASE_RATE, clip_reference))
+    return fixtures
+
+
+def load_shipped_fixtures(fixtures_dir):
+    """manifest.json에 정의된 클립을 그대로 읽습니다."""
+    with open(os.path.join(fixtures_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    fixtures = []
+    for clip in manifest['clips']:
+        path = os.path.join(fixtures_dir, clip['file'])
+        with open(path, 'rb') as f:
+            audio_bytes = f.read()
+        duration = len(load_source(path)) / BASE_RATE
+        fixtures.append((clip['file'], {'file': clip['file']}, audio_bytes, duration, clip.get('reference', '')))
+    return fixtures
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", ' ', text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """단어 단위 편집 거리 / 정답 단어 수. 정답이 비어 있으면 None."""
+    ref = normalize_words(reference)
+    hyp = normalize_words(hypothesis)
+    if not ref:
+        return None
+    row = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ref_word != hyp_word))
+    return row[-1] / len(ref)
+
+
+def peak_rss_mb():
+    """프로세스 최대 RSS(MB). 프로세스 전체 기준 최고치라 클립별로는 구분되지 않으므로 실행 전체에 대해서만 보고합니다."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_clip(server, name, params, audio_bytes, duration, reference, repeats, client_id=None):
+    runs = []
+    for _ in range(repeats):
+        timings = {}
+        start = time.perf_counter()
+        language, text, language_source = server.transcribe_bytes(audio_bytes, timings=timings, client_id=client_id)
+        timings['total'] = time.perf_counter() - start
+        runs.append(timings)
+
+    stages = {stage: statistics.median(run[stage] for run in runs) for stage in STAGES + ['total']}
+    result = {
+        'name': name,
+        'params': params,
+        'audio_seconds': round(duration, 3),
+        'bytes': len(audio_bytes),
+        'rtf': stages['total'] / duration,
+        'stages': stages,
+        'language': language,
+        'language_source': language_source,
+        'reference': reference,
+        'hypothesis': text.strip(),
+        'wer': word_error_rate(reference, text),
+    }
+    wer = '-' if result['wer'] is None else f"{result['wer']:.2f}"
+    print(f"{name:40s} rtf={result['rtf']:.3f} total={stages['total']:.2f}s "
+          + " ".join(f"{stage}={stages[stage]:.2f}s" for stage in STAGES)
+          + f" wer={wer} lang={language}({language_source})")
+    return result
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {result['name']: result for result in baseline['results']}
+    print(f"\nComparison with {baseline_path} (commit {baseline['meta'].get('git_commit')}):")
+    for result in results:
+        old = previous.get(result['name'])
+        if old is None:
+            continue
+        change = (result['rtf'] - old['rtf']) / old['rtf'] * 100 if old['rtf'] else 0.0
+        print(f"{result['name']:40s} rtf {old['rtf']:.3f} -> {result['rtf']:.3f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline transcription benchmark")
+    parser.add_argument('--source', help='Speech file used as the base signal for generated clips')
+    parser.add_argument('--reference', default='', help='Reference transcript of --source')
+    parser.add_argument('--fixtures-dir', help='Directory with manifest.json and extra clips')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per clip (median is reported)')
+    parser.add_argument('--output', default='transcribe_benchmark.json', help='Result JSON path')
+    parser.add_argument('--compare', help='Earlier result JSON to compare against')
+    parser.add_argument('--language-prior', action='store_true',
+                        help='Share one client ID so runs after warm-up use the language prior')
+    args = parser.parse_args()
+
+    if args.source:
+        base = load_source(args.source)
+    else:
+        base = synthetic_speech(2.0)
+    fixtures = generate_fixtures(base, args.reference)
+    if args.fixtures_dir:
+        fixtures += load_shipped_fixtures(args.fixtures_dir)
+
+    import server
+
+    client_id = BENCHMARK_CLIENT_ID if args.language_prior else None
+
+    # 첫 실행의 초기화 비용은 제외 (--language-prior이면 여기서 감지한 언어가 이후 실행의 사전 정보가 됨)
+    server.transcribe_bytes(fixtures[0][2], client_id=client_id)
+
+    results = [run_clip(server, *fixture, repeats=args.repeats, client_id=client_id) for fixture in fixtures]
+
+    wers = [result['wer'] for result in results if result['wer'] is not None]
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_commit': git_commit(),
+            'model': server.WHISPER_MODEL,
+            'compute_type': server.WHISPER_COMPUTE_TYPE,
+            'cpu_count': os.cpu_count(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'repeats': args.repeats,
+            'source': args.source or 'synthetic',
+            'language_prior': args.language_prior,
+        },
+        'summary': {
+            'mean_rtf': statistics.mean(result['rtf'] for result in results),
+            'max_rtf': max(result['rtf'] for result in results),
+            'mean_wer': statistics.mean(wers) if wers else None,
+            'peak_rss_mb': peak_rss_mb(),
+        },
+        'results': results,
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nmean rtf={report['summary']['mean_rtf']:.3f}, results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Gunicorn configuration for server.py.
+
+    gunicorn -c gunicorn.conf.py server:app
+
+The Whisper model is loaded exactly once, in a single worker process, and
+requests are served concurrently by that worker's thread pool. Decoding
+concurrency comes from WHISPER_NUM_WORKERS model replicas, which share one
+copy of the weights, so each extra concurrent decode only costs its own
+decoding buffers instead of another full model.
+
+Why not preload_app with several forked workers: CTranslate2 starts its
+replica threads when the model is constructed and threads do not survive
+fork(), so a model built in the master hangs on first use in every child
+(and a CUDA context cannot be inherited at all). Recorded audio is also
+kept in process memory between /record/ and /transcribe/, which only works
+when both requests reach the same process.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+# 모델은 워커 프로세스 하나에만 로드 - 동시성은 스레드로 확보
+workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = False
+
+# server.py가 전사 대기열 길이를 요청 스레드 수에서 계산하도록 전달
+os.environ['GUNICORN_THREADS'] = str(threads)
+# 모델 복제본 수는 요청 스레드가 아니라 CPU 코어 수로 정함 - 복제본마다 CTranslate2 기본값인
+# 4개 코어를 쓰도록 해, 한가할 때 전사 하나가 예전보다 느려지지 않게 함 (4코어 VM이면 복제본 1개)
+# server.py가 요청 스레드의 1/4(최소 1개)을 녹음/검색/다운로드용으로 남기고 나머지를 디코딩과 대기열에 나눔
+os.environ.setdefault('WHISPER_NUM_WORKERS', str(max(1, (os.cpu_count() or 1) // 4)))
+
+# 긴 비디오 다운로드와 모델 로딩 시간을 고려한 타임아웃
+timeout = 600
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
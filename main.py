@@ -3,64 +3,87 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.textinput import TextInput
 from kivy.uix.video import Video
+from kivy.clock import Clock
 from pytubefix import YouTube
 from pytubefix.cli import on_progress
 from googleapiclient.discovery import build
 import os
 # os.environ['YOUTUBE_API_KEY'] = 'your_api_key_here'
 import sounddevice as sd
+import numpy as np
+import threading
 import warnings
 import torch
-import scipy.io.wavfile as wavfile
+from math import gcd
+from scipy.signal import resample_poly
 from faster_whisper import WhisperModel
 warnings.filterwarnings("ignore")
 
+WHISPER_SAMPLE_RATE = 16000  # Whisper 모델 입력 샘플레이트
+
 class MyApp(App):
     def build(self):
         api_key = os.getenv('YOUTUBE_API_KEY')
         self.youtube = build('youtube', 'v3', developerKey=api_key)
-        self.model = WhisperModel("turbo", device="cuda" if torch.cuda.is_available() else "cpu")
+        self.model = None
         self.layout = BoxLayout(orientation='vertical')
-        self.button = Button(text="Start Recording", size_hint=(1, 0.2))
+        # 모델 로딩이 끝날 때까지 녹음 버튼 비활성화
+        self.button = Button(text="Loading model...", size_hint=(1, 0.2), disabled=True)
         self.button.bind(on_press=self.record_and_transcribe)
         self.video = Video(size_hint=(1, 0.8))
 
 
         self.layout.add_widget(self.video)
         self.layout.add_widget(self.button)
+        
+        # 창이 먼저 뜨도록 모델은 백그라운드 스레드에서 로드
+        threading.Thread(target=self.load_model, daemon=True).start()
         return self.layout
 
+    def load_model(self):
+        """Whisper 모델을 로드한 뒤 UI 스레드에서 녹음 버튼을 활성화합니다."""
+        try:
+            model = WhisperModel("turbo", device="cuda" if torch.cuda.is_available() else "cpu")
+        except Exception as e:
+            message = f"Model load failed: {str(e)}"
+            print(message)
+            Clock.schedule_once(lambda dt: setattr(self.button, 'text', message))
+            return
+        self.model = model
+        Clock.schedule_once(self.on_model_loaded)
+
+    def on_model_loaded(self, dt):
+        self.button.text = "Start Recording"
+        self.button.disabled = False
+
     def record_and_transcribe(self, instance):
-        # OS 독립적인 오디오 녹음 구현
-        fs = 44100  # 샘플링 레이트
+        if self.model is None:
+            return
+        
+        # OS 독립적인 오디오 녹음 구현 - 장치 기본 샘플레이트로 float32 녹음
+        fs = int(sd.query_devices(kind='input')['default_samplerate'])
         duration = 7  # 녹음 시간 (초)
         
         print("녹음을 시작합니다...")
-        recording = sd.rec(int(duration * fs), samplerate=fs, channels=1)
+        recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='float32')
         sd.wait()  # 녹음이 끝날 때까지 대기
         
-        # WAV 파일로 저장
-        wavfile.write('audio.wav', fs, recording)
+        # 파일로 저장하지 않고 16kHz float32 버퍼로 변환해 모델에 바로 전달
+        audio = recording[:, 0]
+        if fs != WHISPER_SAMPLE_RATE:
+            g = gcd(fs, WHISPER_SAMPLE_RATE)
+            audio = resample_poly(audio, WHISPER_SAMPLE_RATE // g, fs // g)
+        audio = audio.astype(np.float32, copy=False)
         
-        # 언어 감지 먼저 수행
+        # 언어 감지와 전사를 한 번의 디코딩으로 수행
         segments, info = self.model.transcribe(
-            "audio.wav",
-            beam_size=2,
-            word_timestamps=False,
-            language=None  # 자동 언어 감지 활성화
-        )
-        
-        detected_language = info.language
-        print(f"감지된 언어: {detected_language}")
-        
-        # 감지된 언어로 다시 전사
-        segments, _ = self.model.transcribe(
-            "audio.wav",
+            audio,
             beam_size=5,
             word_timestamps=False,
-            language=detected_language  # 감지된 언어 사용
+            language=None  # 자동 언어 감지 활성화
         )
         result = " ".join([segment.text for segment in segments])
+        print(f"감지된 언어: {info.language}")
 
         # print the recognized text
         print(result)